@@ -3,7 +3,9 @@
 
 This script watches the Alpha price for a destination subnet (default 117) and, when the
 price falls below a configured TAO threshold, issues an `add_stake` extrinsic to deposit
-fresh stake from the wallet's coldkey balance into the destination subnet. The wallet and
+fresh stake from the wallet's coldkey balance into the destination subnet. The price is
+re-checked whenever a new finalized block arrives (with `--interval` as an upper bound on
+the wait), so no RPC calls are made while the chain state is unchanged. The wallet and
 amount to stake are provided by command line arguments.
 
 Example usage:
@@ -19,19 +21,27 @@ Example usage:
 from __future__ import annotations
 
 import argparse
+import asyncio
+import functools
+import logging
+import signal
 import sys
-import time
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 if TYPE_CHECKING:  # pragma: no cover - imports for type checkers only
     import bittensor as bt
     from bittensor.utils.balance import Balance
 
 DEFAULT_THRESHOLD = 0.0017  # TAO
-DEFAULT_INTERVAL = 60.0  # seconds
+DEFAULT_INTERVAL = 60.0  # seconds, max wait for a new block
 DEFAULT_RATE_TOLERANCE = 0.025  # 2.5%
 DEFAULT_NETWORK = "finney"
+DEFAULT_MAX_IN_FLIGHT = 1
+RESUBSCRIBE_DELAY = 1.0  # seconds
+UNCONFIRMED_MAX_BLOCKS = 10  # give up on a no-wait submission that never shows in the balance
+RAO_PER_TAO = 10**9
+FEE_MARGIN_RAO = 1_000_000  # 0.001 TAO left on the coldkey to pay the extrinsic fee
 
 
 @dataclass
@@ -51,6 +61,11 @@ class Args:
     rate_tolerance: float
     wait_for_finalization: bool
     wait_for_inclusion: bool
+    batch_window_blocks: int
+    max_in_flight: int
+    # Monetary values in integer rao (planck) for the hot loop.
+    amount_rao: int
+    threshold_rao: int
 
 
 def parse_args(argv: list[str] | None = None) -> Args:
@@ -111,7 +126,7 @@ def parse_args(argv: list[str] | None = None) -> Args:
         "--interval",
         type=float,
         default=DEFAULT_INTERVAL,
-        help="Polling interval in seconds between price checks (default: 60)",
+        help="Maximum seconds to wait for a new finalized block before re-checking the price (default: 60)",
     )
     parser.add_argument(
         "--max-swaps",
@@ -150,6 +165,25 @@ def parse_args(argv: list[str] | None = None) -> Args:
         action="store_true",
         help="Return immediately after submitting the extrinsic (no inclusion wait)",
     )
+    parser.add_argument(
+        "--batch-window-blocks",
+        type=int,
+        default=0,
+        help=(
+            "Queue triggered stakes and submit them as one Utility.batch_all extrinsic every N blocks "
+            "(0 = submit each stake immediately, default: 0)"
+        ),
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=(
+            "Maximum number of submitted stake extrinsics awaiting inclusion while the price watch "
+            "continues; with --no-wait-for-inclusion a submission counts until the coldkey balance "
+            f"reflects it (default: {DEFAULT_MAX_IN_FLIGHT})"
+        ),
+    )
 
     parsed = parser.parse_args(argv)
 
@@ -167,6 +201,10 @@ def parse_args(argv: list[str] | None = None) -> Args:
         parser.error("--max-swaps must be zero or a positive integer")
     if parsed.rate_tolerance < 0:
         parser.error("--rate-tolerance must be non-negative")
+    if parsed.batch_window_blocks < 0:
+        parser.error("--batch-window-blocks must be zero or a positive integer")
+    if parsed.max_in_flight <= 0:
+        parser.error("--max-in-flight must be greater than zero")
 
     return Args(
         wallet_name=parsed.wallet_name,
@@ -184,6 +222,10 @@ def parse_args(argv: list[str] | None = None) -> Args:
         rate_tolerance=parsed.rate_tolerance,
         wait_for_finalization=parsed.wait_for_finalization,
         wait_for_inclusion=not parsed.no_wait_for_inclusion,
+        batch_window_blocks=parsed.batch_window_blocks,
+        max_in_flight=parsed.max_in_flight,
+        amount_rao=round(parsed.amount_tao * RAO_PER_TAO),
+        threshold_rao=round(parsed.threshold_tao * RAO_PER_TAO),
     )
 
 
@@ -203,9 +245,106 @@ def format_balance(balance: Optional[Balance]) -> str:
     return f"{balance.tao:.9f} {balance.unit}"
 
 
-def main(argv: list[str] | None = None) -> int:
-    args = parse_args(argv)
+def block_cache(fn):
+    """Cache an async function's results by argument until ``cache_clear()`` is called.
+
+    Callers clear the cache on every new block (and after their own writes), so entries are
+    only served for repeat reads within the same block. Exceptions are not cached.
+    """
+    cache: dict[tuple, Any] = {}
 
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        if key in cache:
+            return cache[key]
+        result = await fn(*args, **kwargs)
+        cache[key] = result
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+async def watch_finalized_heads(subtensor, new_block: asyncio.Event) -> None:
+    """Set ``new_block`` every time the chain finalizes a new block header."""
+
+    async def on_head(obj, update_nr, subscription_id):
+        new_block.set()
+        return None  # returning None keeps the subscription open
+
+    await subtensor.substrate.subscribe_block_headers(on_head, finalized_only=True)
+
+
+async def wait_for_block(new_block: asyncio.Event, max_wait: float) -> bool:
+    """Wait for the next finalized block, or at most ``max_wait`` seconds.
+
+    Returns ``True`` if a block arrived and ``False`` if the wait timed out.
+    """
+    try:
+        await asyncio.wait_for(new_block.wait(), timeout=max_wait)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        new_block.clear()
+    return True
+
+
+async def compose_stake_call(
+    substrate,
+    hotkey_ss58: str,
+    args: Args,
+    amount: Balance,
+    price: Optional[Balance] = None,
+):
+    """Compose an ``add_stake`` call, or ``add_stake_limit`` when safe staking is enabled."""
+    if args.safe_staking:
+        return await substrate.compose_call(
+            call_module="SubtensorModule",
+            call_function="add_stake_limit",
+            call_params={
+                "hotkey": hotkey_ss58,
+                "netuid": args.netuid,
+                "amount_staked": amount.rao,
+                "limit_price": int(price.rao * (1 + args.rate_tolerance)),
+                "allow_partial": args.allow_partial,
+            },
+        )
+    return await substrate.compose_call(
+        call_module="SubtensorModule",
+        call_function="add_stake",
+        call_params={
+            "hotkey": hotkey_ss58,
+            "netuid": args.netuid,
+            "amount_staked": amount.rao,
+        },
+    )
+
+
+async def submit_call(substrate, wallet, args: Args, call) -> bool:
+    """Sign ``call`` with the coldkey and submit it, honouring the configured wait flags."""
+    extrinsic = await substrate.create_signed_extrinsic(call=call, keypair=wallet.coldkey)
+    receipt = await substrate.submit_extrinsic(
+        extrinsic,
+        wait_for_inclusion=args.wait_for_inclusion,
+        wait_for_finalization=args.wait_for_finalization,
+    )
+    if not (args.wait_for_inclusion or args.wait_for_finalization):
+        return True
+    return await receipt.is_success
+
+
+async def submit_stake_batch(substrate, wallet, args: Args, calls: list) -> bool:
+    """Submit all ``calls`` as a single atomic ``Utility.batch_all`` extrinsic."""
+    batch = await substrate.compose_call(
+        call_module="Utility",
+        call_function="batch_all",
+        call_params={"calls": calls},
+    )
+    return await submit_call(substrate, wallet, args, batch)
+
+
+async def amain(args: Args) -> int:
     try:
         import bittensor as bt
         from bittensor.utils.balance import Balance
@@ -219,141 +358,331 @@ def main(argv: list[str] | None = None) -> int:
 
     wallet = load_wallet(bt, args.wallet_name, args.wallet_hotkey)
     hotkey_ss58 = wallet.hotkey.ss58_address
+    coldkey_ss58 = wallet.coldkeypub.ss58_address
     bt.logging.info(f"Using hotkey {hotkey_ss58}")
+    if not args.dry_run:
+        # Decrypt the coldkey once so signing in the loop never blocks on a password prompt.
+        wallet.unlock_coldkey()
 
-    subtensor = bt.subtensor(network=args.network)
-    bt.logging.info(f"Connected to network '{args.network}'")
-
-    target_amount = Balance.from_tao(args.amount_tao, netuid=args.netuid)
-
+    target_amount = Balance.from_rao(args.amount_rao, netuid=args.netuid)
+    target_amount_str = format_balance(target_amount)
     stakes_completed = 0
-    while args.max_stakes == 0 or stakes_completed < args.max_stakes:
-        coldkey_balance: Optional[Balance] = None
-        origin_stake: Optional[Balance] = None
-        destination_stake: Optional[Balance] = None
-
-        try:
-            price = subtensor.get_subnet_price(netuid=args.netuid)
-        except Exception as err:  # pylint: disable=broad-except
-            bt.logging.error(f"Failed to fetch subnet price: {err}")
-            time.sleep(args.interval)
-            continue
-
-        bt.logging.info(
-            f"Subnet {args.netuid} price: {price.tao:.9f} TAO (threshold {args.threshold_tao:.9f} TAO)"
-        )
-
-        try:
-            coldkey_balance = subtensor.get_balance(wallet.coldkeypub.ss58_address)
-        except Exception as err:  # pylint: disable=broad-except
-            bt.logging.error(f"Failed to fetch coldkey balance: {err}")
-
-        try:
-            origin_stake = subtensor.get_stake_for_hotkey(
-                hotkey_ss58=hotkey_ss58,
-                netuid=args.origin_netuid,
-            )
-        except Exception as err:  # pylint: disable=broad-except
-            bt.logging.error(
-                f"Unable to fetch stake on origin netuid {args.origin_netuid}: {err}"
-            )
-
-        try:
-            destination_stake = subtensor.get_stake_for_hotkey(
-                hotkey_ss58=hotkey_ss58,
-                netuid=args.netuid,
+    pending_stakes: list[Balance] = []
+    # Submitted extrinsics still awaiting inclusion, mapped to the stakes they carry.
+    in_flight: dict[asyncio.Task, list[Balance]] = {}
+    # No-wait submissions (--no-wait-for-inclusion) whose stake has not yet shown up in the
+    # coldkey balance: (stakes, balance in rao at or below which they have landed, blocks waited).
+    unconfirmed: list[tuple[list[Balance], int, int]] = []
+    last_balance_rao: Optional[int] = None
+    blocks_since_queued = 0
+    last_price: Optional[Balance] = None
+
+    async with bt.AsyncSubtensor(network=args.network) as subtensor:
+        bt.logging.info(f"Connected to network '{args.network}'")
+
+        # Balances and stakes only change between blocks; re-reads without a new block (the
+        # --interval fallback) are served from memory.
+        get_balance = block_cache(subtensor.get_balance)
+        get_stake_for_hotkey = block_cache(subtensor.get_stake_for_hotkey)
+
+        # Never stake the coldkey below the existential deposit plus a fee margin, or the
+        # extrinsic cannot pay for itself and is rejected on every block.
+        existential_deposit = await subtensor.get_existential_deposit()
+        reserve_rao = existential_deposit.rao + FEE_MARGIN_RAO
+
+        substrate = subtensor.substrate
+        # The full-amount add_stake call never changes, so compose it once up front. Safe staking
+        # embeds the current price as a limit and has to be composed per submission.
+        stake_call = None
+        if not args.safe_staking:
+            stake_call = await compose_stake_call(substrate, hotkey_ss58, args, target_amount)
+
+        async def stake_call_for(amount: Balance, price: Balance):
+            if stake_call is not None and amount is target_amount:
+                return stake_call
+            return await compose_stake_call(substrate, hotkey_ss58, args, amount, price)
+
+        def submissions_outstanding() -> int:
+            return len(in_flight) + len(unconfirmed)
+
+        def on_submission_done(label: str, landed_rao: Optional[int], task: asyncio.Task) -> None:
+            nonlocal stakes_completed
+            amounts = in_flight.pop(task)
+            if task.cancelled():
+                return
+            err = task.exception()
+            if err is not None:
+                bt.logging.error(f"{label} submission failed: {err}")
+            elif task.result():
+                bt.logging.success(f"{label} extrinsic with {len(amounts)} stake(s) submitted successfully")
+                stakes_completed += len(amounts)
+                get_balance.cache_clear()
+                get_stake_for_hotkey.cache_clear()
+                if not (args.wait_for_inclusion or args.wait_for_finalization) and landed_rao is not None:
+                    # Only submitted, not included: keep counting it until the balance reflects it.
+                    unconfirmed.append((amounts, landed_rao, 0))
+            else:
+                bt.logging.warning(f"{label} extrinsic was not confirmed as successful")
+
+        def start_submission(label: str, submission, amounts: list[Balance]) -> None:
+            # Inclusion is awaited in the background so the price watch keeps running meanwhile.
+            # The balance this submission lands at must also account for every earlier stake that
+            # was not yet reflected in last_balance_rao, or one landing would release several.
+            landed_rao = None
+            if last_balance_rao is not None:
+                outstanding_rao = sum(amount.rao for stakes in in_flight.values() for amount in stakes)
+                outstanding_rao += sum(amount.rao for stakes, _, _ in unconfirmed for amount in stakes)
+                landed_rao = last_balance_rao - outstanding_rao - sum(amount.rao for amount in amounts)
+            task = asyncio.create_task(submission)
+            in_flight[task] = amounts
+            task.add_done_callback(functools.partial(on_submission_done, label, landed_rao))
+
+        async def flush_pending_stakes() -> None:
+            nonlocal blocks_since_queued
+            batch = list(pending_stakes)
+            pending_stakes.clear()
+            blocks_since_queued = 0
+            total = Balance.from_rao(sum(amount.rao for amount in batch), netuid=args.netuid)
+            bt.logging.info(
+                f"Submitting batch of {len(batch)} stake(s) totalling {format_balance(total)} "
+                f"to netuid {args.netuid}"
             )
-        except Exception as err:  # pylint: disable=broad-except
-            bt.logging.error(
-                f"Unable to fetch stake on destination netuid {args.netuid}: {err}"
+            try:
+                calls = [await stake_call_for(amount, last_price) for amount in batch]
+            except Exception as err:  # pylint: disable=broad-except
+                bt.logging.error(f"batch_all submission failed: {err}")
+                return
+            start_submission("batch_all", submit_stake_batch(substrate, wallet, args, calls), batch)
+
+        new_block = asyncio.Event()
+        new_block.set()  # run the first price check immediately
+        watching_heads = True
+
+        def start_head_watcher() -> asyncio.Task:
+            task = asyncio.create_task(watch_finalized_heads(subtensor, new_block))
+            task.add_done_callback(on_head_watcher_done)
+            return task
+
+        def restart_head_watcher() -> None:
+            nonlocal head_watcher
+            if watching_heads:
+                head_watcher = start_head_watcher()
+
+        def on_head_watcher_done(task: asyncio.Task) -> None:
+            if task.cancelled() or not watching_heads:
+                return
+            # Without the subscription the loop would silently degrade to --interval polling.
+            bt.logging.warning(
+                f"Block header subscription ended ({task.exception()!r}); "
+                f"resubscribing in {RESUBSCRIBE_DELAY:.0f}s"
             )
+            asyncio.get_running_loop().call_later(RESUBSCRIBE_DELAY, restart_head_watcher)
 
-        bt.logging.info(
-            f"Balances — coldkey {format_balance(coldkey_balance)} | "
-            f"origin netuid {args.origin_netuid} stake {format_balance(origin_stake)} | "
-            f"target netuid {args.netuid} stake {format_balance(destination_stake)}"
-        )
+        head_watcher = start_head_watcher()
 
-        if price.tao <= args.threshold_tao:
-            bt.logging.info(
-                f"Price below threshold, preparing stake of {format_balance(target_amount)}"
-            )
+        # Ctrl-C / SIGTERM stop the loop cleanly so queued stakes still get flushed below.
+        stop = asyncio.Event()
 
-            if coldkey_balance is None:
-                bt.logging.warning("Coldkey balance unavailable; skipping this interval")
-                time.sleep(args.interval)
-                continue
+        def request_stop() -> None:
+            stop.set()
+            new_block.set()
 
-            available_tao = coldkey_balance.tao
-            requested_tao = args.amount_tao
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, request_stop)
 
-            if available_tao <= 0:
-                bt.logging.warning(
-                    f"No liquid TAO available in coldkey balance (available {format_balance(coldkey_balance)})"
+        try:
+            while args.max_stakes == 0 or stakes_completed < args.max_stakes:
+                block_arrived = await wait_for_block(new_block, args.interval)
+                if stop.is_set():
+                    break
+                if block_arrived:
+                    get_balance.cache_clear()
+                    get_stake_for_hotkey.cache_clear()
+
+                if pending_stakes:
+                    blocks_since_queued += block_arrived
+                    if (
+                        blocks_since_queued >= args.batch_window_blocks
+                        and submissions_outstanding() < args.max_in_flight
+                    ):
+                        await flush_pending_stakes()
+
+                price, coldkey_balance, origin_stake, destination_stake = await asyncio.gather(
+                    subtensor.get_subnet_price(netuid=args.netuid),
+                    get_balance(coldkey_ss58),
+                    get_stake_for_hotkey(hotkey_ss58=hotkey_ss58, netuid=args.origin_netuid),
+                    get_stake_for_hotkey(hotkey_ss58=hotkey_ss58, netuid=args.netuid),
+                    return_exceptions=True,
                 )
-                time.sleep(args.interval)
-                continue
 
-            if not args.allow_partial and available_tao < requested_tao:
-                bt.logging.warning(
-                    f"Insufficient coldkey balance (have {available_tao:.9f} TAO, "
-                    f"need {requested_tao:.9f} TAO). Enable --allow-partial to stake the available amount."
-                )
-                time.sleep(args.interval)
-                continue
+                if isinstance(price, Exception):
+                    bt.logging.error(f"Failed to fetch subnet price: {price}")
+                    continue
+                last_price = price
 
-            stake_tao = min(available_tao, requested_tao) if args.allow_partial else requested_tao
+                # Skip building the per-block status lines when INFO is filtered out anyway.
+                log_status = bt.logging.get_level() <= logging.INFO
+                if log_status:
+                    bt.logging.info(
+                        f"Subnet {args.netuid} price: {price.tao:.9f} TAO (threshold {args.threshold_tao:.9f} TAO)"
+                    )
 
-            if stake_tao <= 0:
-                bt.logging.warning("Calculated stake amount is zero; skipping this interval")
-                time.sleep(args.interval)
-                continue
+                if isinstance(coldkey_balance, Exception):
+                    bt.logging.error(f"Failed to fetch coldkey balance: {coldkey_balance}")
+                    coldkey_balance = None
+                else:
+                    last_balance_rao = coldkey_balance.rao
+
+                if unconfirmed and block_arrived and coldkey_balance is not None:
+                    # Release strictly in submission order: an entry only leaves once every earlier
+                    # one has, so a single balance drop can never free more than it accounts for.
+                    still_unconfirmed = []
+                    for amounts, landed_rao, blocks_waited in unconfirmed:
+                        if still_unconfirmed:
+                            still_unconfirmed.append((amounts, landed_rao, blocks_waited + 1))
+                            continue
+                        if coldkey_balance.rao <= landed_rao:
+                            continue
+                        if blocks_waited + 1 >= UNCONFIRMED_MAX_BLOCKS:
+                            bt.logging.warning(
+                                f"Submitted stake(s) not reflected in the coldkey balance after "
+                                f"{UNCONFIRMED_MAX_BLOCKS} blocks; no longer reserving them"
+                            )
+                            continue
+                        still_unconfirmed.append((amounts, landed_rao, blocks_waited + 1))
+                    unconfirmed[:] = still_unconfirmed
+
+                if isinstance(origin_stake, Exception):
+                    bt.logging.error(
+                        f"Unable to fetch stake on origin netuid {args.origin_netuid}: {origin_stake}"
+                    )
+                    origin_stake = None
 
-            amount_to_stake = Balance.from_tao(stake_tao, netuid=args.netuid)
+                if isinstance(destination_stake, Exception):
+                    bt.logging.error(
+                        f"Unable to fetch stake on destination netuid {args.netuid}: {destination_stake}"
+                    )
+                    destination_stake = None
 
-            if args.dry_run:
-                bt.logging.info(
-                    f"Dry run: would stake {format_balance(amount_to_stake)} to netuid {args.netuid}"
-                )
-                stakes_completed += 1
-            else:
-                bt.logging.info(
-                    f"Submitting stake of {format_balance(amount_to_stake)} to netuid {args.netuid}"
-                )
-                success = False
-                try:
-                    success = subtensor.add_stake(
-                        wallet=wallet,
-                        hotkey_ss58=hotkey_ss58,
-                        netuid=args.netuid,
-                        amount=amount_to_stake,
-                        wait_for_inclusion=args.wait_for_inclusion,
-                        wait_for_finalization=args.wait_for_finalization,
-                        safe_staking=args.safe_staking,
-                        allow_partial_stake=args.allow_partial,
-                        rate_tolerance=args.rate_tolerance,
+                if log_status:
+                    bt.logging.info(
+                        f"Balances — coldkey {format_balance(coldkey_balance)} | "
+                        f"origin netuid {args.origin_netuid} stake {format_balance(origin_stake)} | "
+                        f"target netuid {args.netuid} stake {format_balance(destination_stake)}"
                     )
-                except Exception as err:  # pylint: disable=broad-except
-                    bt.logging.error(f"add_stake submission failed: {err}")
-                else:
-                    if success:
-                        bt.logging.success("add_stake extrinsic submitted successfully")
-                        stakes_completed += 1
-                    else:
-                        bt.logging.warning("add_stake extrinsic was not confirmed as successful")
 
-            if args.max_stakes and stakes_completed >= args.max_stakes:
-                break
+                if price.rao <= args.threshold_rao:
+                    in_flight_stakes = sum(len(amounts) for amounts in in_flight.values())
+                    committed = stakes_completed + len(pending_stakes) + in_flight_stakes
+                    if args.max_stakes and committed >= args.max_stakes:
+                        bt.logging.debug("Price below threshold but all stakes are already submitted or queued")
+                        continue
+
+                    bt.logging.info(
+                        f"Price below threshold, preparing stake of {target_amount_str}"
+                    )
+
+                    if coldkey_balance is None:
+                        bt.logging.warning("Coldkey balance unavailable; skipping this interval")
+                        continue
+
+                    # Queued, in-flight and not-yet-included stakes have not left the coldkey balance yet,
+                    # and the existential deposit plus fee margin must stay behind.
+                    available_rao = coldkey_balance.rao - sum(amount.rao for amount in pending_stakes)
+                    available_rao -= sum(amount.rao for amounts in in_flight.values() for amount in amounts)
+                    available_rao -= sum(amount.rao for amounts, _, _ in unconfirmed for amount in amounts)
+                    available_rao -= reserve_rao
+
+                    if available_rao <= 0:
+                        bt.logging.warning(
+                            f"No liquid TAO available in coldkey balance (available {format_balance(coldkey_balance)})"
+                        )
+                        continue
+
+                    if not args.allow_partial and available_rao < args.amount_rao:
+                        bt.logging.warning(
+                            f"Insufficient coldkey balance (have {available_rao / RAO_PER_TAO:.9f} TAO, "
+                            f"need {args.amount_tao:.9f} TAO). Enable --allow-partial to stake the available amount."
+                        )
+                        continue
+
+                    stake_rao = min(available_rao, args.amount_rao) if args.allow_partial else args.amount_rao
+
+                    if stake_rao <= 0:
+                        bt.logging.warning("Calculated stake amount is zero; skipping this interval")
+                        continue
+
+                    # Only partial stakes need a fresh Balance; full stakes reuse the precomputed one.
+                    amount_to_stake = (
+                        target_amount
+                        if stake_rao == args.amount_rao
+                        else Balance.from_rao(stake_rao, netuid=args.netuid)
+                    )
+                    amount_str = (
+                        target_amount_str if amount_to_stake is target_amount else format_balance(amount_to_stake)
+                    )
 
-        time.sleep(args.interval)
+                    if args.dry_run:
+                        bt.logging.info(
+                            f"Dry run: would stake {amount_str} to netuid {args.netuid}"
+                        )
+                        stakes_completed += 1
+                    elif args.batch_window_blocks:
+                        pending_stakes.append(amount_to_stake)
+                        bt.logging.info(
+                            f"Queued stake of {amount_str} to netuid {args.netuid} "
+                            f"({len(pending_stakes)} pending)"
+                        )
+                    elif submissions_outstanding() >= args.max_in_flight:
+                        bt.logging.warning(
+                            f"{submissions_outstanding()} stake extrinsic(s) still awaiting inclusion; "
+                            "skipping this interval"
+                        )
+                    else:
+                        bt.logging.info(
+                            f"Submitting stake of {amount_str} to netuid {args.netuid}"
+                        )
+                        try:
+                            call = await stake_call_for(amount_to_stake, price)
+                        except Exception as err:  # pylint: disable=broad-except
+                            bt.logging.error(f"add_stake submission failed: {err}")
+                        else:
+                            start_submission(
+                                "add_stake", submit_call(substrate, wallet, args, call), [amount_to_stake]
+                            )
+
+                    if args.max_stakes and stakes_completed >= args.max_stakes:
+                        break
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            watching_heads = False
+            head_watcher.cancel()
+            if pending_stakes:
+                await flush_pending_stakes()
+            if in_flight:
+                bt.logging.info(f"Waiting for {len(in_flight)} in-flight stake extrinsic(s)")
+                await asyncio.gather(*in_flight, return_exceptions=True)
+
+    if stop.is_set():
+        bt.logging.warning(
+            f"Auto-buy watcher interrupted by user after executing {stakes_completed} stake(s)"
+        )
+        return 130
 
     bt.logging.info(f"Finished after executing {stakes_completed} stake(s)")
     return 0
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
     try:
-        raise SystemExit(main(sys.argv[1:]))
+        return asyncio.run(amain(args))
     except KeyboardInterrupt:
-        bt.logging.warning("Auto-buy watcher interrupted by user")
-        raise SystemExit(130)
\ No newline at end of file
+        # Interrupted before the signal handlers were installed (e.g. while connecting).
+        return 130
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
\ No newline at end of file
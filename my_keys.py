@@ -3,8 +3,9 @@ my_keys.py - List registered Bittensor wallets for a given netuid.
 
 This script scans the default Bittensor wallet directory (~/.bittensor/wallets),
 collects all cold-key wallets whose names start with “c” or “x”, queries the
-local subtensor metagraph for the specified netuid (default 117), and prints
-the wallet names together with their UID on that subnet.
+local subtensor's uid → hotkey map (SubtensorModule.Keys) for the specified
+netuid (default 117), and prints the wallet names together with their UID on
+that subnet.
 
 Usage:
     python my_keys.py
@@ -12,14 +13,38 @@ Usage:
 
 
 import bittensor as bt
+from bittensor.core.chain_data.utils import decode_account_id
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+KEYS_TTL = 12.0  # seconds, roughly one block
+KEYFILE_WORKERS = 16
+
+_SUB = bt.subtensor("local")
+_KEYS_CACHE: dict[int, tuple[float, dict[str, int]]] = {}
+
+def get_hotkey_uids(netuid: int) -> dict[str, int]:
+    """Return {hotkey ss58: uid} for netuid, reusing a cached copy younger than KEYS_TTL."""
+    cached = _KEYS_CACHE.get(netuid)
+    if cached is not None and time.monotonic() - cached[0] < KEYS_TTL:
+        return cached[1]
+    # Only the uid -> hotkey storage map is needed, not a full metagraph sync.
+    keys = _SUB.substrate.query_map(module="SubtensorModule", storage_function="Keys", params=[netuid])
+    # AccountId values come back as raw bytes, not ss58 strings.
+    hk_to_uid = {decode_account_id(hotkey.value[0]): int(getattr(uid, "value", uid)) for uid, hotkey in keys}
+    _KEYS_CACHE[netuid] = (time.monotonic(), hk_to_uid)
+    return hk_to_uid
 
 def get_coldkey_wallets_for_path(path: str) -> list[bt.Wallet]:
     """Get all coldkey wallet names from path."""
     try:
         wallet_names = next(os.walk(os.path.expanduser(path)))[1]
-        # sort wallet names alphabetically (but c123 after c23)
-        wallet_names = sorted(wallet_names, key=lambda x: (x[0], int(x[1:]) if x[1:].isdigit() else x[1:]))
+        # sort wallet names alphabetically (but c123 after c23); numeric suffixes sort before
+        # non-numeric ones so the key tuples never compare int with str
+        keyed = [((n[0], 0, int(n[1:]), "") if n[1:].isdigit() else (n[0], 1, 0, n[1:]), n) for n in wallet_names]
+        keyed.sort()
+        wallet_names = [n for _, n in keyed]
         return [bt.Wallet(path=path, name=name) for name in wallet_names if name.startswith('c') or name.startswith('x')]
     except StopIteration:
         # No wallet files found.
@@ -28,9 +53,14 @@ def get_coldkey_wallets_for_path(path: str) -> list[bt.Wallet]:
 
 def get_registered_wallets(wallets, netuid) -> list[bt.Wallet]:
     """Get all registered coldkey wallets."""
-    s = bt.subtensor("local")
-    m = s.metagraph(netuid=netuid)
-    registered_wallets = [(wallet, m.hotkeys.index(wallet.hotkey.ss58_address)) for wallet in wallets if wallet.hotkey.ss58_address in m.hotkeys]
+    hk_to_uid = get_hotkey_uids(netuid)
+    # Loading each hotkey reads its keyfile from disk; do those reads concurrently.
+    with ThreadPoolExecutor(max_workers=KEYFILE_WORKERS) as ex:
+        ss58s = list(ex.map(lambda wallet: wallet.hotkey.ss58_address, wallets))
+    registered_wallets = []
+    for wallet, ss58 in zip(wallets, ss58s):
+        if ss58 in hk_to_uid:
+            registered_wallets.append((wallet, hk_to_uid[ss58]))
     return registered_wallets
 
 def print_wallets(wallets):
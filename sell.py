@@ -2,64 +2,186 @@
 Automated Bittensor subnet-price watcher & unstaker.
 
 Logic overview:
-- Polls the live TAO price of subnet 117 on a local subtensor in a tight loop.
+- Subscribes to finalized block headers on a local subtensor and checks the TAO price
+  of subnet 117 once per new block (prices only change between blocks).
 - Two price thresholds govern behavior:
-  - 0.0015 TAO: minimum interest level; prints status only every 200 loops.
+  - 0.0015 TAO: minimum interest level; prints status on every block.
   - 0.0020 TAO: trigger level; executes an unstake action.
 - When the trigger is hit:
   - Unstakes exactly 10 TAO from validator 5H4BrsKdARdeWr5koKjru35dEVB9a35c7gToykhaCzYaDeaT.
-  - Transfers proceeds back to coldkey wallet “c0”.
+  - Transfers proceeds back to coldkey wallet “c0”; the new balance is derived from the
+    extrinsic's StakeRemoved event rather than re-queried.
+- The coldkey is unlocked once at startup using the password in the BT_COLDKEY_PW
+  environment variable (or an interactive prompt if it is unset); the decrypted keypair
+  is reused for every unstake, so the key derivation only runs once.
+- Runs on an asyncio event loop; Ctrl-C / SIGTERM stop it cleanly after the current block.
+- Every RPC wait is bounded by one block time; on a stall the connection is re-opened,
+  and after several stale blocks it fails over to BT_BACKUP_NETWORK if that is set.
 - Global counters:
-  - cnt: total loop iterations.
+  - cnt: total blocks processed.
   - sell_cnt: successful unstake operations.
-- All blockchain interactions use the local subtensor and btcli via pexpect.
+- All blockchain interactions use a single local subtensor connection.
 """
 
+import asyncio
+import os
+import signal
+
 import bittensor as bt
-import pexpect
-import time
+from bittensor.utils.balance import Balance
 
-s = bt.subtensor("local")
+RPC_TIMEOUT = 12.0  # seconds, one block
+BLOCK_TIMEOUT = 2 * RPC_TIMEOUT  # finalized heads may lag a block behind
+UNSTAKE_TIMEOUT = BLOCK_TIMEOUT  # compose + sign + submit + wait for inclusion
+MAX_STALE_BLOCKS = 3
+RECONNECT_DELAY = 1.0
+NETWORKS = ["local"] + ([os.environ["BT_BACKUP_NETWORK"]] if os.environ.get("BT_BACKUP_NETWORK") else [])
 
-def get_subnet_price(netuid = 117):
-    price = s.get_subnet_price(netuid)
+async def get_subnet_price(subtensor, netuid = 117):
+    price = await asyncio.wait_for(subtensor.get_subnet_price(netuid), timeout=RPC_TIMEOUT)
     return price
 
 cnt = 0
 buy_cnt = 0
 sell_cnt = 0
+block_number = None
+
+VALIDATOR_HOTKEY = "5H4BrsKdARdeWr5koKjru35dEVB9a35c7gToykhaCzYaDeaT"
+UNSTAKE_AMOUNT = Balance.from_tao(10, netuid=117)
 
 wallet = bt.wallet(name='c0')
-balance = s.get_balance(wallet.coldkeypub.ss58_address)
+coldkey_pw = os.environ.pop("BT_COLDKEY_PW", None)
+if coldkey_pw:
+    wallet.coldkey_file.save_password_to_env(coldkey_pw)
+try:
+    wallet.unlock_coldkey()
+finally:
+    # save_password_to_env leaves a reversible copy in BT_PW_<path>; don't let it outlive the unlock.
+    if coldkey_pw:
+        wallet.coldkey_file.remove_password_from_env()
+del coldkey_pw
+balance = None
 
-def unstake():
+async def unstake(s):
     global balance
     global sell_cnt
-    child = pexpect.spawn("btcli stake remove --wallet.name c0 --netuid 117 --unsafe -in 5H4BrsKdARdeWr5koKjru35dEVB9a35c7gToykhaCzYaDeaT --amount 10 --quiet --subtensor.network local")
-    child.expect("Would you like to continue")
-    child.sendline("y")
-    child.expect("Enter your password")
-    child.sendline("ChainDude321!a")
-    child.interact()
-    new_balance = s.get_balance(wallet.coldkeypub.ss58_address)
-    if new_balance > balance:
+    call = await s.substrate.compose_call(
+        call_module="SubtensorModule",
+        call_function="remove_stake",
+        call_params={"hotkey": VALIDATOR_HOTKEY, "netuid": 117, "amount_unstaked": UNSTAKE_AMOUNT.rao},
+    )
+    extrinsic = await s.substrate.create_signed_extrinsic(call=call, keypair=wallet.coldkey)
+    receipt = await s.substrate.submit_extrinsic(extrinsic, wait_for_inclusion=True)
+    if not await receipt.is_success:
+        print(f"Unstake failed: {await receipt.error_message}")
+        return
+    # Work out the balance change from the receipt's events instead of re-querying it.
+    # StakeRemoved is (coldkey, hotkey, tao_amount, alpha_amount, netuid, ...); the fee
+    # comes from the receipt, which reads TransactionFeePaid's named actual_fee field.
+    delta = -int(await receipt.total_fee_amount)
+    for e in await receipt.triggered_events:
+        event = e["event"]
+        if event["module_id"] == "SubtensorModule" and event["event_id"] == "StakeRemoved":
+            delta += int(event["attributes"][2])
+    if delta > 0:
+        if balance is None:
+            # No starting balance to apply the delta to; read the post-sell balance instead.
+            balance = await s.get_balance(wallet.coldkeypub.ss58_address)
+        else:
+            balance = balance + Balance.from_rao(delta)
         sell_cnt += 1
-        print(f"Sell successful! New balance: {new_balance} TAO, total sells: {sell_cnt}")
-        balance = new_balance
+        print(f"Sell successful! New balance: {balance} TAO, total sells: {sell_cnt}")
+
+async def on_block(s):
+    global cnt
+    price = await get_subnet_price(s, 117)
+    cnt += 1
+    if float(price) > 0.0015:
+        print(f"Block {block_number}: subnet price is {price} TAO, which is above threshold of 0.0015 TAO. Not Selling.")
+        if float(price) > 0.0020:
+            print(f"Current subnet price is {price} TAO, which is above 0.0019 TAO. Unstaking now...")
+            try:
+                await asyncio.wait_for(unstake(s), timeout=UNSTAKE_TIMEOUT)
+            except asyncio.TimeoutError:
+                # The extrinsic may still land; the reconnect path takes over from here.
+                print(f"Unstake not included within {UNSTAKE_TIMEOUT}s, it may still be pending")
+                raise
+
+async def connect(network, on_head):
+    s = bt.AsyncSubtensor(network)
+    try:
+        await s.initialize()
+    except BaseException:
+        # Also runs when wait_for cancels us on timeout, so the half-open socket is not leaked.
+        await disconnect(s, None)
+        raise
+    heads = asyncio.create_task(s.substrate.subscribe_block_headers(on_head, finalized_only=True))
+    return s, heads
+
+async def disconnect(s, heads):
+    if heads is not None:
+        heads.cancel()
+    if s is not None:
+        try:
+            await s.close()
+        except Exception as e:
+            print(f"Error while closing connection: {e}")
 
-while True:
+async def main():
+    global balance
+    new_block = asyncio.Event()
+    running = asyncio.Event()
+    running.set()
+
+    def stop():
+        running.clear()
+        new_block.set()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop)
+
+    async def on_head(obj, update_nr, subscription_id):
+        global block_number
+        block_number = obj["header"]["number"]
+        new_block.set()
+        # Returning None keeps the subscription alive.
+        return None
+
+    network_idx = 0
+    stale = 0  # consecutive timeouts since the last good block
+    s = heads = None
     try:
-        price = get_subnet_price(117)
-        if float(price) > 0.0015:
-            if cnt % 200 == 0:
-                print(f"Current subnet price is {price} TAO, which is above threshold of 0.0015 TAO. Not Selling.")
-            cnt += 1
-            if float(price) > 0.0020:
-                print(f"Current subnet price is {price} TAO, which is above 0.0019 TAO. Unstaking now...")
-                unstake()
-            time.sleep(0.05)
-            continue
-        time.sleep(0.1)
-    except Exception as e:
-        print(f"Exception occurred: {e}")
-        time.sleep(0.1)
\ No newline at end of file
+        while running.is_set():
+            try:
+                if s is None:
+                    try:
+                        s, heads = await asyncio.wait_for(connect(NETWORKS[network_idx], on_head), timeout=RPC_TIMEOUT)
+                    except Exception as e:
+                        # Any connect failure (handshake, bad URI, ...) counts as a stall.
+                        raise ConnectionError(f"connect to {NETWORKS[network_idx]} failed: {e!r}") from e
+                if balance is None:
+                    # Retried every pass until it succeeds, not only right after connecting.
+                    balance = await asyncio.wait_for(s.get_balance(wallet.coldkeypub.ss58_address), timeout=RPC_TIMEOUT)
+                await asyncio.wait_for(new_block.wait(), timeout=BLOCK_TIMEOUT)
+                new_block.clear()
+                if not running.is_set():
+                    break
+                await on_block(s)
+                stale = 0
+            except (asyncio.TimeoutError, OSError) as e:
+                stale += 1
+                if stale > MAX_STALE_BLOCKS and len(NETWORKS) > 1:
+                    network_idx = (network_idx + 1) % len(NETWORKS)
+                    stale = 0
+                print(f"Subtensor unresponsive ({e!r}), reconnecting to {NETWORKS[network_idx]}...")
+                await disconnect(s, heads)
+                s = heads = None
+                await asyncio.sleep(RECONNECT_DELAY)
+            except Exception as e:
+                print(f"Exception occurred: {e}")
+    finally:
+        await disconnect(s, heads)
+    print(f"Stopped after {cnt} blocks, total sells: {sell_cnt}")
+
+asyncio.run(main())